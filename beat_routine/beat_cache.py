@@ -0,0 +1,63 @@
+"""
+On-disk cache for beat tracking results.
+Beat tracking a whole song is deterministic but slow, so results are stored
+in a sidecar file keyed by a hash of the audio bytes.
+"""
+
+import logging
+from hashlib import blake2b
+from pathlib import Path
+
+import librosa
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Files are hashed in pieces so the whole song never has to be held in memory
+_HASH_CHUNK_BYTES = 1 << 20
+
+
+def _file_digest(path):
+    digest = blake2b(digest_size=8)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_beats(audio_file, y, sr, hop_length=512, onset_envelope=None):
+    """
+    Return (tempo_bpm, beat_frames) for an audio file, tracking beats only on a cache miss.
+
+    Args:
+        audio_file: Path to the audio file, used for the cache key and location
+        y: Mono samples of the file, analysed on a cache miss (may be None if
+            onset_envelope is given)
+        sr: Sample rate of the audio
+        hop_length: Hop length of the beat frames
+        onset_envelope: Optional callable returning the onset envelope, used
+            instead of y on a cache miss by callers that stream the audio
+    """
+    cache_path = Path(f"{audio_file}.{_file_digest(audio_file)}.beats.npz")
+
+    if cache_path.exists():
+        try:
+            with np.load(cache_path) as cached:
+                if int(cached["sr"]) == sr and int(cached["hop_length"]) == hop_length:
+                    return float(cached["tempo"]), cached["beat_frames"]
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning("Ignoring unreadable beat cache %s: %s", cache_path, e)
+
+    tempo, beat_frames = librosa.beat.beat_track(
+        y=y,
+        sr=sr,
+        onset_envelope=onset_envelope() if onset_envelope is not None else None,
+        hop_length=hop_length,
+    )
+    tempo = float(np.atleast_1d(tempo)[0])
+
+    try:
+        np.savez(cache_path, sr=sr, hop_length=hop_length, tempo=tempo, beat_frames=beat_frames)
+    except OSError as e:
+        logger.warning("Could not write beat cache %s: %s", cache_path, e)
+    return tempo, beat_frames
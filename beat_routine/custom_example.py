@@ -1,20 +1,34 @@
 import asyncio
+import atexit
 import logging
+import queue
 import shutil
 import subprocess
 import time
+from functools import lru_cache, partial
+from itertools import cycle, groupby, islice
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 from typing import Awaitable, Callable, List, Tuple, NamedTuple
 import librosa
-import IPython.display as ipd
+import numpy as np
+import soundfile as sf
 
+from beat_cache import load_beats
 from go1pylib.go1 import Go1, Go1Mode
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+# Configure logging. Records are handed to a queue and written by a
+# background listener so console I/O stays off the dance loop.
+_log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+_queue_handler = QueueHandler(_log_queue)
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+_stream_handler = logging.StreamHandler()
+_stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+_log_listener = QueueListener(_log_queue, _stream_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+logging.basicConfig(level=logging.INFO, handlers=[_queue_handler])
 logger = logging.getLogger(__name__)
 
 # ============================================================================
@@ -28,42 +42,129 @@ SONG_TITLE = "Uptown Funk"
 SONG_CLIP_START_OFFSET = "0:00"
 SONG_CLIP_DURATION_S = 270  # Full clip duration in seconds
 
-# Load audio and extract tempo/beat information
-try:
-    if not Path(SONG_CLIP_PATH).is_file():
-        logger.warning(f"Audio file not found: {SONG_CLIP_PATH}. Using default values.")
-        y, sr = None, None
-        beat_frames = []
-        tempo, beat_times = 117, [0.0]
-    else:
-        y, sr = librosa.load(SONG_CLIP_PATH)
-        tempo, beat_frames = librosa.beat.beat_track(y=y, sr=sr)
-        beat_times = librosa.frames_to_time(beat_frames, sr=sr)
-        if tempo <= 0:
-            tempo = 117  # Default fallback
-        if len(beat_times) == 0:
-            beat_times = [0.0]
-except Exception as e:
-    logger.warning(f"Error loading audio file: {e}. Using default values.")
-    y, sr = None, None
-    beat_frames = []
-    tempo, beat_times = 117, [0.0]
-
-# Create click track to hear beats with audio
-if y is not None and len(beat_frames) > 0:
-    clicks = librosa.clicks(frames=beat_frames, sr=sr, length=len(y))
-    y_with_clicks = y + clicks * 0.5
-    ipd.Audio(y_with_clicks, rate=sr)
-else:
-    logger.warning("Skipping audio playback - audio file not loaded")
-print(f"Tempo: {tempo} BPM")
-print(f"Beat times (seconds): {beat_times}")
-
-# Calculate beat timing constants
-BEAT_DURATION_MS = int((60 / tempo) * 1000)  # Duration of one beat in milliseconds
-TWO_BEAT_DURATION_MS = BEAT_DURATION_MS * 2  # Duration of two beats
-
-logger.info(f"Calculated Beat Duration: {BEAT_DURATION_MS}ms per beat ({tempo} BPM)")
+# Fallback tempo when the audio file is unavailable
+DEFAULT_TEMPO = 117
+
+# Audio is analysed in blocks of this length to bound peak memory
+BEAT_TRACK_BLOCK_S = 30
+ONSET_N_FFT = 2048
+ONSET_HOP_LENGTH = 512
+
+# Set True to synthesize a click track over the clip for previewing beats
+DEBUG_AUDIO = False
+
+
+def _read_mono(path: str) -> Tuple[np.ndarray, int]:
+    """
+    Read an audio file as mono float32 at its native sample rate.
+    
+    Args:
+        path: Path to the audio file
+        
+    Returns:
+        Tuple of (samples, sample_rate)
+    """
+    y, sr = sf.read(path, dtype="float32")
+    if y.ndim == 2:
+        y = y.mean(axis=1)
+    return y, sr
+
+
+def _onset_envelope(path: str) -> Tuple[np.ndarray, int]:
+    """
+    Compute the onset strength envelope of an audio file block by block.
+    
+    Only one block of samples is held in memory at a time. Mel spectra are
+    framed without per-block padding, carrying each block's unfinished frames
+    into the next, and the dB conversion and spectral flux run once over the
+    whole track, so the result matches ``onset_strength`` on the full file.
+    
+    Args:
+        path: Path to the audio file
+        
+    Returns:
+        Tuple of (onset_envelope, sample_rate)
+    """
+    sr = sf.info(path).samplerate
+    mel = partial(
+        librosa.feature.melspectrogram, sr=sr, n_fft=ONSET_N_FFT,
+        hop_length=ONSET_HOP_LENGTH, center=False, fmax=0.5 * sr
+    )
+    # Half a window of zeros at each end reproduces a centred whole-file STFT
+    edge = np.zeros(ONSET_N_FFT // 2, dtype=np.float32)
+    
+    def mono_blocks():
+        for block in sf.blocks(path, blocksize=sr * BEAT_TRACK_BLOCK_S, dtype="float32"):
+            yield block.mean(axis=1) if block.ndim == 2 else block
+        yield edge
+    
+    spectra = []
+    carry = edge
+    for block in mono_blocks():
+        samples = np.concatenate([carry, block])
+        n_frames = (len(samples) - ONSET_N_FFT) // ONSET_HOP_LENGTH + 1
+        if n_frames <= 0:
+            carry = samples
+            continue
+        spectra.append(mel(y=samples[:(n_frames - 1) * ONSET_HOP_LENGTH + ONSET_N_FFT]))
+        carry = samples[n_frames * ONSET_HOP_LENGTH:]
+    
+    S = librosa.power_to_db(np.concatenate(spectra, axis=1))
+    onset_env = librosa.onset.onset_strength(
+        S=S, sr=sr, n_fft=ONSET_N_FFT, hop_length=ONSET_HOP_LENGTH
+    )
+    return onset_env, sr
+
+
+def _preview_clicks(path: str, beat_times: np.ndarray) -> None:
+    """
+    Render the clip with a click on every detected beat (Jupyter only).
+    
+    Args:
+        path: Path to the audio file
+        beat_times: Beat times in seconds
+    """
+    try:
+        import IPython.display as ipd
+    except ImportError:
+        logger.warning("IPython not available; skipping click-track preview")
+        return
+    y, sr = _read_mono(path)
+    clicks = librosa.clicks(times=beat_times, sr=sr, length=len(y))
+    ipd.display(ipd.Audio(y + clicks * 0.5, rate=sr))
+
+
+def _extract_beats(path: str) -> Tuple[float, np.ndarray]:
+    """
+    Extract tempo and beat times, falling back to defaults if the audio is unusable.
+    
+    Args:
+        path: Path to the audio file
+        
+    Returns:
+        Tuple of (tempo_bpm, beat_times_seconds)
+    """
+    try:
+        if not Path(path).is_file():
+            logger.warning(f"Audio file not found: {path}. Using default values.")
+            return DEFAULT_TEMPO, np.zeros(1)
+        sr = sf.info(path).samplerate
+        # Beat tracking streams the audio, so only the onset envelope is computed on a miss
+        tempo, beat_frames = load_beats(
+            path, None, sr, hop_length=ONSET_HOP_LENGTH,
+            onset_envelope=lambda: _onset_envelope(path)[0]
+        )
+        beat_times = librosa.frames_to_time(beat_frames, sr=sr, hop_length=ONSET_HOP_LENGTH)
+    except Exception as e:
+        logger.warning(f"Error loading audio file: {e}. Using default values.")
+        return DEFAULT_TEMPO, np.zeros(1)
+    
+    if tempo <= 0:
+        tempo = DEFAULT_TEMPO  # Default fallback
+    if len(beat_times) == 0:
+        beat_times = np.zeros(1)
+    return tempo, beat_times
+
 
 # Set True to auto-play the clip via ffplay (if available).
 AUTO_PLAY = False
@@ -75,10 +176,37 @@ class Move(NamedTuple):
     description: str
 
 
+class Section(NamedTuple):
+    """A labeled block of moves mapped onto a range of beats."""
+    label: str
+    start_beat: int
+    end_beat: int
+    start_s: float
+    end_s: float
+    mode: Go1Mode
+    intensity: float
+    moves: List[Move]
+    duration_ms: int  # Duration of each move, aligned to this section's beats
+
+
 # ============================================================================
 # BEAT-TO-MODE MAPPING SYSTEM
 # ============================================================================
 
+@lru_cache(maxsize=64)
+def _mode_for_range(beat_range: int) -> Go1Mode:
+    """Map the length of a beat range to a robot mode."""
+    # Beat ranges mapped to modes
+    if beat_range <= 2:
+        return Go1Mode.STAND  # Short bursts stay in stand mode
+    elif beat_range <= 4:
+        return Go1Mode.DANCE1  # Medium phrases use dance1
+    elif beat_range <= 8:
+        return Go1Mode.DANCE2  # Longer phrases use dance2
+    else:
+        return Go1Mode.STAND  # Default fallback
+
+
 class BeatModeMapper:
     """Maps beat ranges to robot modes for synchronized choreography."""
     
@@ -93,6 +221,9 @@ class BeatModeMapper:
         self.beat_times = beat_times
         self.tempo = tempo
         self.beat_duration_s = 60 / tempo
+        # Contiguous float64 copy for O(1) clamped lookups
+        self._bt = np.asarray(beat_times, dtype=np.float64)
+        self._n = self._bt.size
         
     def get_mode_for_beat_range(self, start_beat: int, end_beat: int) -> Go1Mode:
         """
@@ -105,17 +236,7 @@ class BeatModeMapper:
         Returns:
             Go1Mode appropriate for this beat range
         """
-        beat_range = end_beat - start_beat
-        
-        # Beat ranges mapped to modes
-        if beat_range <= 2:
-            return Go1Mode.STAND  # Short bursts stay in stand mode
-        elif beat_range <= 4:
-            return Go1Mode.DANCE1  # Medium phrases use dance1
-        elif beat_range <= 8:
-            return Go1Mode.DANCE2  # Longer phrases use dance2
-        else:
-            return Go1Mode.STAND  # Default fallback
+        return _mode_for_range(end_beat - start_beat)
             
     def get_beat_time_range(self, start_beat: int, end_beat: int) -> Tuple[float, float]:
         """
@@ -133,20 +254,51 @@ class BeatModeMapper:
         """
         if start_beat < 0 or end_beat < 0:
             raise ValueError(f"Beat indices cannot be negative: start={start_beat}, end={end_beat}")
-        if start_beat >= len(self.beat_times):
-            logger.warning(f"Start beat {start_beat} exceeds available beats {len(self.beat_times)}")
-            start_beat = len(self.beat_times) - 1
-        if end_beat > len(self.beat_times):
-            logger.warning(f"End beat {end_beat} exceeds available beats {len(self.beat_times)}")
-            end_beat = len(self.beat_times)
+        # Out-of-range indices are clamped to the last detected beat
+        last = self._n - 1
+        i = min(start_beat, last)
+        j = min(max(end_beat - 1, 0), last)
+        return (float(self._bt[i]), float(self._bt[j]))
+    
+    def get_section_ranges(self, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Split the detected beats into consecutive, equally sized sections.
+        
+        The last section absorbs any remaining beats.
         
-        start_time = self.beat_times[start_beat] if start_beat < len(self.beat_times) else self.beat_times[-1]
-        end_time = self.beat_times[end_beat - 1] if (end_beat - 1) < len(self.beat_times) else self.beat_times[-1]
-        return (start_time, end_time)
+        Args:
+            count: Number of sections
+            
+        Returns:
+            Tuple of (beat_ranges, time_ranges), each of shape (count, 2), holding
+            [start_beat, end_beat) and (start_time_seconds, end_time_seconds)
+        """
+        bounds = np.arange(count + 1) * (self._n // count)
+        bounds[-1] = self._n
+        beat_ranges = np.column_stack((bounds[:-1], bounds[1:]))
+        time_ranges = self._bt[np.clip(beat_ranges - [0, 1], 0, self._n - 1)]
+        return beat_ranges, time_ranges
+    
+    def get_beat_interval_s(self, start_beat: int, end_beat: int) -> float:
+        """
+        Get the mean time between consecutive beats in a beat range.
+        
+        Falls back to the tempo-derived beat duration when the range holds
+        fewer than two beats.
+        
+        Args:
+            start_beat: Starting beat index
+            end_beat: Ending beat index (exclusive)
+            
+        Returns:
+            Mean inter-beat interval in seconds
+        """
+        intervals = np.diff(self._bt[start_beat:end_beat])
+        return float(intervals.mean()) if intervals.size else self.beat_duration_s
     
     def get_total_beats(self) -> int:
         """Get the total number of detected beats."""
-        return len(self.beat_times)
+        return self._n
 
 
 async def maybe_start_music() -> None:
@@ -180,10 +332,9 @@ def build_sequence(pattern: List[Move], count: int) -> List[Move]:
     Returns:
         List of moves (repeated pattern truncated to count)
     """
-    sequence: List[Move] = []
-    while len(sequence) < count:
-        sequence.extend(pattern)
-    return sequence[:count]
+    if not pattern:
+        return []
+    return list(islice(cycle(pattern), count))
 
 
 async def perform_block(
@@ -203,36 +354,52 @@ async def perform_block(
         moves: List of Move objects to execute
         intensity: Speed multiplier (0.0 to 1.0)
         duration_ms: Duration for each move in milliseconds
-        pause_s: Pause between moves in seconds
+        pause_s: Pause between moves in seconds (consecutive repeats of the
+            same move are merged into one command with no pause between them)
         mode: Go1Mode to set before executing moves
-        
-    Raises:
-        RuntimeError: If connection is lost during execution
     """
     logger.info("Block: %s (intensity: %.0f%%, mode: %s)", label, intensity * 100, mode.value)
     
     # Set mode for this block
     dog.set_mode(mode)
-    await asyncio.sleep(1)  # Allow mode transition time
+    await dog.wait_for_mode(mode, timeout=1.0)  # Allow mode transition time
     
-    for i, move in enumerate(moves):
-        # Check connection status
-        if not dog.mqtt.connected:
-            logger.error("Lost connection during block '%s' at move %d/%d", 
-                        label, i + 1, len(moves))
-            raise RuntimeError("MQTT connection lost during dance")
-
-        logger.info("  [%d/%d] %s", i + 1, len(moves), move.description)
+    # Fold runs of the same move into a single, longer command, and format
+    # each run's log line up front so the timed loop only emits it
+    runs: List[Tuple[Move, Callable[[], Awaitable[None]], int, str]] = []
+    position = 0
+    for func, group in groupby(moves, key=lambda m: m.func):
+        run = list(group)
+        position += len(run)
+        call = partial(func, speed=intensity, duration_ms=duration_ms * len(run))
+        repeat = f" x{len(run)}" if len(run) > 1 else ""
+        runs.append((run[0], call, len(run),
+                     f"  [{position}/{len(moves)}] {run[0].description}{repeat}"))
+    
+    # Schedule against absolute deadlines so per-move jitter does not accumulate
+    move_s = duration_ms / 1000.0
+    next_start = time.perf_counter()
+    
+    for move, call, count, log_msg in runs:
+        delay = next_start - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        logger.info(log_msg)
         
         try:
-            # Call the move function with parameters
-            await move.func(speed=intensity, duration_ms=duration_ms)
-            await asyncio.sleep(pause_s)
+            await call()
+            next_start += count * move_s + pause_s
         except Exception as e:
             logger.error("Error executing move '%s': %s", move.description, str(e))
             raise
 
 
+async def _watch_disconnect(dog: Go1, task: asyncio.Task) -> None:
+    """Cancel the dance task as soon as the robot connection drops."""
+    await dog.wait_for_disconnect()
+    task.cancel()
+
+
 async def main():
     """
     Custom dance routine based on dance.py, timed to a 60s clip with tempo reference.
@@ -244,33 +411,34 @@ async def main():
     4. Executes a 4-part dance with music synchronized to beats
     5. Safely returns to walk mode
     """
+    # Extract beats in a worker thread while the robot connects
+    beats_future = asyncio.get_running_loop().run_in_executor(
+        None, _extract_beats, SONG_CLIP_PATH
+    )
+    
     dog = None
     try:
         # Initialize robot
         logger.info("Initializing Go1 robot...")
         dog = Go1()
 
-        # Connect to robot
+        # Connect to robot (blocks until the broker acknowledges, raises
+        # ConnectionError on timeout or refusal)
         logger.info("Connecting to MQTT broker at 192.168.12.1:1883...")
         dog.init()
-
-        # Wait for connection with proper timeout handling
-        timeout = 10
-        start_time = time.time()
-        while not dog.mqtt.connected:
-            elapsed = time.time() - start_time
-            if elapsed > timeout:
-                logger.error("Connection timeout after %.1f seconds", elapsed)
-                raise ConnectionError(f"Failed to connect within {timeout}s")
-            logger.debug("Waiting for connection... %.1fs", elapsed)
-            await asyncio.sleep(0.1)
-
         logger.info("Connected to robot!")
 
         # Initial wait for robot to stabilize
         logger.info("Stabilizing robot...")
         await asyncio.sleep(2)
 
+        tempo, beat_times = await beats_future
+        beat_duration_ms = int((60 / tempo) * 1000)  # Duration of one beat in milliseconds
+        logger.info(f"Tempo: {tempo:.1f} BPM, {len(beat_times)} beats detected")
+        logger.info(f"Calculated Beat Duration: {beat_duration_ms}ms per beat ({tempo:.1f} BPM)")
+        if DEBUG_AUDIO:
+            _preview_clicks(SONG_CLIP_PATH, beat_times)
+
         # Initialize beat-to-mode mapper
         logger.info("Initializing beat-to-mode mapper...")
         beat_mapper = BeatModeMapper(beat_times, tempo)
@@ -279,29 +447,34 @@ async def main():
         
         # Calculate dynamic beat ranges based on song length
         # Divide the song into 4 sections proportionally
-        section_size = total_beats // 4
-        warmup_start, warmup_end = 0, min(section_size, total_beats)
-        verse_start, verse_end = warmup_end, min(warmup_end + section_size, total_beats)
-        chorus_start, chorus_end = verse_end, min(verse_end + section_size, total_beats)
-        finale_start, finale_end = chorus_end, total_beats
+        section_labels = ("Warmup", "Verse", "Chorus", "Finale")
+        beat_ranges, time_ranges = beat_mapper.get_section_ranges(len(section_labels))
         
-        logger.info(f"Beat sections: Warmup[{warmup_start}-{warmup_end}] Verse[{verse_start}-{verse_end}] Chorus[{chorus_start}-{chorus_end}] Finale[{finale_start}-{finale_end}]")
+        logger.info("Beat sections: " + " ".join(
+            f"{label}[{start}-{end}]" for label, (start, end) in zip(section_labels, beat_ranges)
+        ))
 
         # Set to stand mode for choreography
         logger.info("Setting initial stand mode for choreography...")
         dog.set_mode(Go1Mode.STAND)
-        await asyncio.sleep(3)  # Increased wait for mode change
+        if not await dog.wait_for_mode(Go1Mode.STAND, timeout=3.0):
+            logger.warning("Stand mode not confirmed by robot, continuing anyway")
+
+        # Stop dancing immediately if the connection drops mid-routine
+        dance_task = asyncio.current_task()
+        watchdog = asyncio.create_task(_watch_disconnect(dog, dance_task))
 
         try:
             await maybe_start_music()
 
             # Calculate timings based on BPM
-            # At detected tempo: align moves with beat structure
-            move_duration_ms = TWO_BEAT_DURATION_MS  # Align with beat structure
+            # Each move spans two beats; sections refine this from their own beat intervals
+            beats_per_move = 2
+            move_duration_ms = beat_duration_ms * beats_per_move  # Align with beat structure
             pause_s = 0.2  # 200ms pause for recovery
 
             logger.info("Dance timing: %dms per move (%.2f beats), %dms pause",
-                       move_duration_ms, move_duration_ms / BEAT_DURATION_MS, int(pause_s * 1000))
+                       move_duration_ms, move_duration_ms / beat_duration_ms, int(pause_s * 1000))
 
             # Define base movement patterns
             base_pattern: List[Move] = [
@@ -318,15 +491,37 @@ async def main():
                 Move(dog.squat_down, "Squat down"),
             ]
 
-            # Build dance sections with proper move counts
-            warmup_moves = build_sequence(base_pattern, 10)
-            verse_moves = build_sequence(base_pattern + bounce_pattern, 15)
-            chorus_moves = build_sequence(bounce_pattern + base_pattern + bounce_pattern, 15)
-            finale_moves = build_sequence(base_pattern + bounce_pattern, 10)
+            # Build dance sections with proper move counts and intensities
+            section_plan = (
+                (0.5, build_sequence(base_pattern, 10)),
+                (0.7, build_sequence(base_pattern + bounce_pattern, 15)),
+                (0.9, build_sequence(bounce_pattern + base_pattern + bounce_pattern, 15)),
+                (1.0, build_sequence(base_pattern + bounce_pattern, 10)),
+            )
+            sections = [
+                Section(
+                    label=label,
+                    start_beat=int(start),
+                    end_beat=int(end),
+                    start_s=float(start_s),
+                    end_s=float(end_s),
+                    mode=beat_mapper.get_mode_for_beat_range(int(start), int(end)),
+                    intensity=intensity,
+                    moves=moves,
+                    duration_ms=int(
+                        beat_mapper.get_beat_interval_s(int(start), int(end)) * beats_per_move * 1000
+                    ),
+                )
+                for label, (start, end), (start_s, end_s), (intensity, moves)
+                in zip(section_labels, beat_ranges, time_ranges, section_plan)
+            ]
 
             # Calculate estimated timing
-            total_moves = len(warmup_moves) + len(verse_moves) + len(chorus_moves) + len(finale_moves)
-            estimated_duration = total_moves * (move_duration_ms / 1000.0 + pause_s)
+            total_moves = sum(len(section.moves) for section in sections)
+            estimated_duration = sum(
+                len(section.moves) * (section.duration_ms / 1000.0 + pause_s)
+                for section in sections
+            )
             logger.info("Routine will execute %d moves in approximately %.1fs",
                        total_moves, estimated_duration)
 
@@ -337,54 +532,32 @@ async def main():
             # Execute dance blocks with beat-mapped modes
             logger.info("Starting beat-synchronized dance routine!")
             
-            # Warmup section: first quarter, uses STAND mode for stability
-            warmup_mode = beat_mapper.get_mode_for_beat_range(warmup_start, warmup_end)
-            warmup_start_s, warmup_end_s = beat_mapper.get_beat_time_range(warmup_start, warmup_end)
-            logger.info(f"Warmup section: beats {warmup_start}-{warmup_end} ({warmup_start_s:.2f}s - {warmup_end_s:.2f}s), mode: {warmup_mode.value}")
-            await perform_block(dog, "Warmup (50% intensity)", warmup_moves, 0.5, 
-                              move_duration_ms, pause_s, mode=warmup_mode)
-            await dog.reset_body()
-            await asyncio.sleep(0.5)
-
-            # Verse section: second quarter, uses DANCE1 for dynamic movement
-            verse_mode = beat_mapper.get_mode_for_beat_range(verse_start, verse_end)
-            verse_start_s, verse_end_s = beat_mapper.get_beat_time_range(verse_start, verse_end)
-            logger.info(f"Verse section: beats {verse_start}-{verse_end} ({verse_start_s:.2f}s - {verse_end_s:.2f}s), mode: {verse_mode.value}")
-            await perform_block(dog, "Verse (70% intensity)", verse_moves, 0.7, 
-                              move_duration_ms, pause_s, mode=verse_mode)
-            await dog.reset_body()
-            await asyncio.sleep(0.5)
-
-            # Chorus section: third quarter, uses DANCE2 for complex choreography
-            chorus_mode = beat_mapper.get_mode_for_beat_range(chorus_start, chorus_end)
-            chorus_start_s, chorus_end_s = beat_mapper.get_beat_time_range(chorus_start, chorus_end)
-            logger.info(f"Chorus section: beats {chorus_start}-{chorus_end} ({chorus_start_s:.2f}s - {chorus_end_s:.2f}s), mode: {chorus_mode.value}")
-            await perform_block(dog, "Chorus (90% intensity)", chorus_moves, 0.9, 
-                              move_duration_ms, pause_s, mode=chorus_mode)
-            await dog.reset_body()
-            await asyncio.sleep(0.5)
-
-            # Finale section: final quarter, maximal expression
-            finale_mode = beat_mapper.get_mode_for_beat_range(finale_start, finale_end)
-            finale_start_s, finale_end_s = beat_mapper.get_beat_time_range(finale_start, finale_end)
-            logger.info(f"Finale section: beats {finale_start}-{finale_end} ({finale_start_s:.2f}s - {finale_end_s:.2f}s), mode: {finale_mode.value}")
-            await perform_block(dog, "Finale (100% intensity)", finale_moves, 1.0, 
-                              move_duration_ms, pause_s, mode=finale_mode)
-            await dog.reset_body()
-            await asyncio.sleep(1)
+            for index, section in enumerate(sections):
+                logger.info(f"{section.label} section: beats {section.start_beat}-{section.end_beat} ({section.start_s:.2f}s - {section.end_s:.2f}s), mode: {section.mode.value}, {section.duration_ms}ms per move")
+                await perform_block(dog, f"{section.label} ({section.intensity:.0%} intensity)",
+                                    section.moves, section.intensity,
+                                    section.duration_ms, pause_s, mode=section.mode)
+                await dog.reset_body()
+                # Give the final block a little longer to settle
+                await asyncio.sleep(1 if index == len(sections) - 1 else 0.5)
 
             # Return to walk mode
             logger.info("Returning to walk mode...")
             dog.set_mode(Go1Mode.WALK)
-            await asyncio.sleep(2)
+            await dog.wait_for_mode(Go1Mode.WALK, timeout=2.0)
 
             logger.info("✓ Custom beat-synchronized dance routine completed successfully!")
 
+        except asyncio.CancelledError:
+            if not watchdog.done():
+                raise
+            if hasattr(dance_task, "uncancel"):
+                dance_task.uncancel()
+            logger.error("✗ MQTT connection lost during dance")
         except Exception as e:
-            logger.error("✗ Error during dance sequence: %s", str(e))
-            import traceback
-            traceback.print_exc()
+            logger.exception("✗ Error during dance sequence: %s", str(e))
         finally:
+            watchdog.cancel()
             # Always ensure we reset the body and stop movement
             try:
                 if dog and dog.mqtt.connected:
@@ -394,9 +567,7 @@ async def main():
                 logger.warning("Error during reset: %s", str(e))
 
     except Exception as e:
-        logger.error("✗ Error initializing robot: %s", str(e))
-        import traceback
-        traceback.print_exc()
+        logger.exception("✗ Error initializing robot: %s", str(e))
     finally:
         # Disconnect cleanly
         if dog is not None:
@@ -1,25 +1,73 @@
-from dataclasses import dataclass
-from typing import Awaitable, Callable, Dict, List, Optional
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 import asyncio
+import sys
+import weakref
 
+try:
+    from go1pylib import Go1Mode
+    _WALK, _STAND = Go1Mode.WALK, Go1Mode.STAND
+except ImportError:
+    # Dry runs work without the robot library installed
+    _WALK = _STAND = None
 
-@dataclass(frozen=True)
+# Slotted dataclasses need Python 3.10+; older versions keep a __dict__
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+# Upper bound on waiting for the robot to report a mode change
+MODE_SWITCH_TIMEOUT_S = 0.3
+
+
+@dataclass(frozen=True, **_SLOTS)
 class DanceStep:
     name: str
-    runner: Callable[["Go1", float], Awaitable[None]]
+    # Go1 coroutine method to call, with the arguments preceding duration_ms
+    method: str
+    args: Tuple[Any, ...] = ()
     turn_rate: float = 0.0
+    # Step must run in walk mode
+    walk: bool = False
+
+    def bind(self, dog: "Go1") -> Callable[[float], Awaitable[None]]:
+        """Return the step as fn(duration_ms) bound to ``dog``."""
+        return partial(getattr(dog, self.method), *self.args)
+
 
+CompiledStep = Tuple[Callable[[float], Awaitable[None]], float]
 
-@dataclass
+# Compiled steps per dog, keyed by move name; dropped with the dog
+_COMPILED_MOVES: "weakref.WeakKeyDictionary[Go1, Dict[str, Tuple[CompiledStep, ...]]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+@dataclass(**_SLOTS)
 class TurnState:
     balance: float = 0.0
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, **_SLOTS)
 class DanceMove:
     name: str
     steps: List[DanceStep]
     description: str
+    net_turn_rate: float = field(init=False, default=0.0)
+    needs_walk: bool = field(init=False, default=False)
+
+    def __post_init__(self) -> None:
+        # Steps share the move's duration equally, so their rates can be summed once
+        object.__setattr__(self, "net_turn_rate", sum(step.turn_rate for step in self.steps))
+        object.__setattr__(self, "needs_walk", any(step.walk for step in self.steps))
+
+    def compile(self, dog: "Go1") -> Tuple[CompiledStep, ...]:
+        """Return this move's steps bound to ``dog`` as (fn, turn_rate) pairs, cached per dog."""
+        compiled_moves = _COMPILED_MOVES.setdefault(dog, {})
+        compiled = compiled_moves.get(self.name)
+        if compiled is None:
+            compiled = tuple((step.bind(dog), step.turn_rate) for step in self.steps)
+            compiled_moves[self.name] = compiled
+        return compiled
 
     async def run(
         self,
@@ -31,67 +79,46 @@ class DanceMove:
             return
         step_duration_ms = (duration_s * 1000.0) / len(self.steps)
         step_duration_s = step_duration_ms / 1000.0
-        for step in self.steps:
-            await step.runner(dog, step_duration_ms)
-            if turn_state is not None and step.turn_rate != 0.0:
-                turn_state.balance += step.turn_rate * step_duration_s
+        if self.needs_walk:
+            # Switch once for the whole move rather than around every walk step
+            await _switch_mode(dog, _WALK)
+        for fn, turn_rate in self.compile(dog):
+            await fn(step_duration_ms)
+            if turn_state is not None and turn_rate != 0.0:
+                turn_state.balance += turn_rate * step_duration_s
+        if self.needs_walk:
+            await _switch_mode(dog, _STAND)
 
 
-def _speed_step(name: str, method_name: str, speed: float) -> DanceStep:
-    async def _run(dog: "Go1", duration_ms: float) -> None:
-        method = getattr(dog, method_name)
-        await method(speed=speed, duration_ms=duration_ms)
+async def _switch_mode(dog: "Go1", mode: "Go1Mode") -> None:
+    dog.set_mode(mode)
+    # Proceed as soon as telemetry confirms the mode, or after the timeout at worst
+    await dog.wait_for_mode(mode, timeout=MODE_SWITCH_TIMEOUT_S)
+
 
-    return DanceStep(name=name, runner=_run)
+def _speed_step(name: str, method_name: str, speed: float) -> DanceStep:
+    return DanceStep(name=name, method=method_name, args=(speed,))
 
 
 def _pose_step(name: str, lean: float, twist: float, look: float, extend: float) -> DanceStep:
-    async def _run(dog: "Go1", duration_ms: float) -> None:
-        await dog.pose(
-            lean=lean,
-            twist=twist,
-            look=look,
-            extend=extend,
-            duration_ms=duration_ms,
-        )
-
-    return DanceStep(name=name, runner=_run)
+    return DanceStep(name=name, method="pose", args=(lean, twist, look, extend))
 
 
 def _turn_step(name: str, direction: str, speed: float) -> DanceStep:
-    async def _run(dog: "Go1", duration_ms: float) -> None:
-        if direction == "left":
-            await dog.turn_left(speed=speed, duration_ms=duration_ms)
-        else:
-            await dog.turn_right(speed=speed, duration_ms=duration_ms)
-
-    turn_rate = speed if direction == "right" else -speed
-    return DanceStep(name=name, runner=_run, turn_rate=turn_rate)
+    if direction == "left":
+        method_name, turn_rate = "turn_left", -speed
+    else:
+        method_name, turn_rate = "turn_right", speed
+    return DanceStep(name=name, method=method_name, args=(speed,), turn_rate=turn_rate)
 
 
 def _wait_step(name: str) -> DanceStep:
-    async def _run(dog: "Go1", duration_ms: float) -> None:
-        await dog.wait(duration_ms)
-
-    return DanceStep(name=name, runner=_run)
+    return DanceStep(name=name, method="wait")
 
 
 def _walk_step(name: str, method_name: str, speed: float) -> DanceStep:
-    async def _run(dog: "Go1", duration_ms: float) -> None:
-        from go1pylib import Go1Mode
-        # Switch to walk mode for actual movement
-        dog.set_mode(Go1Mode.WALK)
-        await asyncio.sleep(0.3)  # Brief pause for mode transition
-        
-        # Execute movement
-        method = getattr(dog, method_name)
-        await method(speed=speed, duration_ms=duration_ms)
-        
-        # Switch back to stand mode
-        dog.set_mode(Go1Mode.STAND)
-        await asyncio.sleep(0.3)  # Brief pause for mode transition
-
-    return DanceStep(name=name, runner=_run)
+    # DanceMove.run switches into walk mode around the move's steps
+    return DanceStep(name=name, method=method_name, args=(speed,), walk=True)
 
 
 DANCE_MOVES: Dict[str, DanceMove] = {
@@ -224,6 +251,9 @@ MOVE_SEQUENCE = MOVE_SEQUENCE + [
     "body_wave",
 ] * 100
 
+# Moves resolved once, so the beat loop never probes DANCE_MOVES
+MOVE_CYCLE = tuple(DANCE_MOVES[name] for name in MOVE_SEQUENCE)
+
 
 async def balance_turn(
     dog: "Go1",
@@ -261,13 +291,14 @@ async def run_move(
     if duration_s <= 0:
         return
     if dry_run:
-        step_duration_s = duration_s / len(move.steps) if move.steps else duration_s
-        for step in move.steps:
-            await asyncio.sleep(step_duration_s)
-            if turn_state is not None and step.turn_rate != 0.0:
-                turn_state.balance += step.turn_rate * step_duration_s
-        if auto_balance_turns and turn_state is not None:
-            await balance_turn(dog, turn_state, balance_speed, dry_run=True)
+        # Nothing observes intermediate state, so the move and any balancing turn share one sleep
+        balance_s = 0.0
+        if turn_state is not None and move.steps:
+            turn_state.balance += move.net_turn_rate * (duration_s / len(move.steps))
+            if auto_balance_turns and balance_speed > 0 and abs(turn_state.balance) > 1e-6:
+                balance_s = abs(turn_state.balance) / balance_speed
+                turn_state.balance = 0.0
+        await asyncio.sleep(duration_s + balance_s)
         return
     await move.run(dog, duration_s, turn_state=turn_state)
     if auto_balance_turns and turn_state is not None:
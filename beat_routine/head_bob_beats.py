@@ -4,9 +4,11 @@ Makes the robot bob its head in sync with music beats.
 """
 
 import asyncio
-import time
 import librosa
+import numpy as np
 import sounddevice as sd
+import soundfile as sf
+from beat_cache import load_beats
 
 DRY_RUN = False  # Set to False to actually control the robot
 BEATS_PER_MOVE = 2  # Number of beats between each move
@@ -19,19 +21,24 @@ async def main():
     # Load and analyze music
     print("Loading music file...")
     audio_file = "beat_routine/up_town_funk.wav"
-    y, sr = librosa.load(audio_file)
+    # Read at the file's native rate; librosa.load would resample the whole song
+    y, sr = sf.read(audio_file, dtype="float32")
+    mono = y.mean(axis=1) if y.ndim > 1 else y
     
     print("Detecting beats...")
-    tempo, beat_frames = librosa.beat.beat_track(y=y, sr=sr)
+    tempo, beat_frames = load_beats(audio_file, mono, sr)
     beat_times = librosa.frames_to_time(beat_frames, sr=sr)
+    # Only every BEATS_PER_MOVE-th beat triggers a move
+    beat_array = np.asarray(beat_times)[::BEATS_PER_MOVE]
+    scheduled_beats = beat_array.tolist()
     
-    print(f"Tempo: {tempo[0]:.1f} BPM")
+    print(f"Tempo: {tempo:.1f} BPM")
     print(f"Detected {len(beat_times)} beats")
     
     dog = None
     # Calculate move duration based on tempo and beats per move
     # Duration = (beats / BPM) * 60 seconds
-    move_duration_s = (BEATS_PER_MOVE / tempo[0]) * 60
+    move_duration_s = (BEATS_PER_MOVE / tempo) * 60
     print(f"Move duration: {move_duration_s}s (fills {BEATS_PER_MOVE} beats)")
     
     
@@ -39,14 +46,10 @@ async def main():
         # Initialize robot
         print("Connecting to robot...")
         dog = Go1()
-        dog.init()
-        
-        # Wait for connection
-        start_time = time.time()
-        while not dog.mqtt.connected and (time.time() - start_time < 10):
-            await asyncio.sleep(0.1)
-        
-        if not dog.mqtt.connected:
+        # init() blocks until the broker acknowledges, so run it off the event loop
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, dog.init)
+        except OSError:  # ConnectionError or a socket error
             print("Failed to connect")
             return
         
@@ -65,25 +68,30 @@ async def main():
     
     # Play music in separate thread
     print(f"Playing music and bobbing head every {BEATS_PER_MOVE} beats!")
+    loop = asyncio.get_running_loop()
     sd.play(y, sr)
     
-    start_time = time.time()
+    start_time = loop.time()  # Monotonic reference for all beat deadlines
     
     try:
-        for i, beat_time in enumerate(beat_times):
-            # Only process every Nth beat
-            if i % BEATS_PER_MOVE != 0:
+        k = 0
+        while k < len(scheduled_beats):
+            beat_time = scheduled_beats[k]
+            elapsed = loop.time() - start_time
+            if beat_time < elapsed - move_duration_s:
+                # Fell more than a move behind; resync to the current musical position
+                caught_up = int(np.searchsorted(beat_array, elapsed))
+                print(f"SKIP {(caught_up - k) * BEATS_PER_MOVE} beats")
+                k = caught_up
                 continue
             
-            # Wait until this beat time
-            current_time = time.time() - start_time
-            wait_time = beat_time - current_time
-            
-            if wait_time > 0:
-                await asyncio.sleep(wait_time)
+            # Wait until this beat's absolute deadline
+            delay = beat_time - elapsed
+            if delay > 0:
+                await asyncio.sleep(delay)
             
             # Run move
-            print(f"Move on beat {i} at {beat_time:.2f}s...")
+            print(f"Move on beat {k * BEATS_PER_MOVE} at {beat_time:.2f}s...")
             print("  → Move START")
             if not DRY_RUN:
                 await dog.look_down(speed=1.0, duration_ms=move_duration_s * 1000 // 3)
@@ -94,6 +102,7 @@ async def main():
                 # Simulate the bob duration in dry run
                 await asyncio.sleep(move_duration_s)
             print("  → Move END")
+            k += 1
     
     except KeyboardInterrupt:
         print("\nStopped by user")
@@ -4,13 +4,18 @@ Runs a sequence of small moves in sync with music beats.
 """
 
 import asyncio
-import time
+from itertools import cycle
 import librosa
+import numpy as np
 import sounddevice as sd
-from dance_moves import DANCE_MOVES, MOVE_SEQUENCE, run_move
+import soundfile as sf
+from beat_cache import load_beats
+from dance_moves import MOVE_CYCLE, run_move
 
 DRY_RUN = False  # Set to False to actually control the robot
 BEATS_PER_MOVE = 2  # Number of beats between each move
+# How long a move may wait for the previous one to finish before it is dropped
+MOVE_OVERRUN_TOLERANCE_S = 0.15
 
 if not DRY_RUN:
     from go1pylib import Go1, Go1Mode
@@ -20,19 +25,23 @@ async def main():
     # Load and analyze music
     print("Loading music file...")
     audio_file = "beat_routine/up_town_funk.wav"
-    y, sr = librosa.load(audio_file)
+    # Read at the file's native rate; librosa.load would resample the whole song
+    y, sr = sf.read(audio_file, dtype="float32")
+    mono = y.mean(axis=1) if y.ndim > 1 else y
     
     print("Detecting beats...")
-    tempo, beat_frames = librosa.beat.beat_track(y=y, sr=sr)
+    tempo, beat_frames = load_beats(audio_file, mono, sr)
     beat_times = librosa.frames_to_time(beat_frames, sr=sr)
+    # Only every BEATS_PER_MOVE-th beat triggers a move
+    scheduled_beats = np.asarray(beat_times)[::BEATS_PER_MOVE].tolist()
     
-    print(f"Tempo: {tempo[0]:.1f} BPM")
+    print(f"Tempo: {tempo:.1f} BPM")
     print(f"Detected {len(beat_times)} beats")
     
     dog = None
     # Calculate move duration based on tempo and beats per move
     # Duration = (beats / BPM) * 60 seconds
-    move_duration_s = (BEATS_PER_MOVE / tempo[0]) * 60
+    move_duration_s = (BEATS_PER_MOVE / tempo) * 60
     print(f"Move duration: {move_duration_s}s (fills {BEATS_PER_MOVE} beats)")
     
     
@@ -40,14 +49,10 @@ async def main():
         # Initialize robot
         print("Connecting to robot...")
         dog = Go1()
-        dog.init()
-        
-        # Wait for connection
-        start_time = time.time()
-        while not dog.mqtt.connected and (time.time() - start_time < 10):
-            await asyncio.sleep(0.1)
-        
-        if not dog.mqtt.connected:
+        # init() blocks until the broker acknowledges, so run it off the event loop
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, dog.init)
+        except OSError:  # ConnectionError or a socket error
             print("Failed to connect")
             return
         
@@ -66,36 +71,55 @@ async def main():
     
     # Play music in separate thread
     print(f"Playing music and dancing every {BEATS_PER_MOVE} beats!")
+    loop = asyncio.get_running_loop()
     sd.play(y, sr)
 
-    start_time = time.time()
-    move_index = 0
+    start_time = loop.time()  # Monotonic reference for all beat deadlines
+    robot_lock = asyncio.Lock()  # Only one move drives the robot at a time
+    move_tasks = []
+    all_spawned = asyncio.Event()
 
-    try:
-        for i, beat_time in enumerate(beat_times):
-            # Only process every Nth beat
-            if i % BEATS_PER_MOVE != 0:
-                continue
+    async def perform_move(k, beat_time, move):
+        # Moves fill their whole slot and routinely finish a little late, so
+        # give the previous one a grace period before dropping this one
+        try:
+            await asyncio.wait_for(robot_lock.acquire(), MOVE_OVERRUN_TOLERANCE_S)
+        except asyncio.TimeoutError:
+            print(f"Skipping beat {k * BEATS_PER_MOVE} at {beat_time:.2f}s: {move.name}")
+            return
+        try:
+            print(f"Move on beat {k * BEATS_PER_MOVE} at {beat_time:.2f}s: {move.name}")
+            print("  → Move START")
+            # Trim a late start off this move so lateness does not accumulate
+            late_s = loop.time() - (start_time + beat_time)
+            await run_move(dog, move, move_duration_s - max(late_s, 0.0), dry_run=DRY_RUN)
+            print("  → Move END")
+        finally:
+            robot_lock.release()
 
-            # Wait until this beat time
-            current_time = time.time() - start_time
-            wait_time = beat_time - current_time
+    def spawn_move(k, beat_time, move):
+        move_tasks.append(asyncio.create_task(perform_move(k, beat_time, move)))
+        if len(move_tasks) == len(scheduled_beats):
+            all_spawned.set()
 
-            if wait_time > 0:
-                await asyncio.sleep(wait_time)
+    # Queue every move at its absolute beat deadline so a slow move never shifts later beats
+    handles = [
+        loop.call_at(start_time + beat_time, spawn_move, k, beat_time, move)
+        for k, (beat_time, move) in enumerate(zip(scheduled_beats, cycle(MOVE_CYCLE)))
+    ]
 
-            # Run move
-            move_name = MOVE_SEQUENCE[move_index % len(MOVE_SEQUENCE)]
-            move = DANCE_MOVES[move_name]
-            move_index += 1
-            print(f"Move on beat {i} at {beat_time:.2f}s: {move.name}")
-            print("  → Move START")
-            await run_move(dog, move, move_duration_s, dry_run=DRY_RUN)
-            print("  → Move END")
+    try:
+        if scheduled_beats:
+            await all_spawned.wait()
+        await asyncio.gather(*move_tasks)
     
     except KeyboardInterrupt:
         print("\nStopped by user")
     finally:
+        for handle in handles:
+            handle.cancel()
+        for task in move_tasks:
+            task.cancel()
         sd.stop()
         if not DRY_RUN and dog:
             await dog.reset_body()
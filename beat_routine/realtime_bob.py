@@ -32,15 +32,30 @@ BOB_DURATION_RATIO = 0.8  # What fraction of the beat period to use for bobbing
 buffer_size = int(SAMPLE_RATE * BUFFER_DURATION)
 chunk_size = int(SAMPLE_RATE * CHUNK_DURATION)
 
+# Onset analysis frame geometry (librosa defaults)
+N_FFT = 2048
+HOP_LENGTH = 512
+onset_frames = buffer_size // HOP_LENGTH  # Envelope frames covering the buffer
+# Onsets past this frame fall within the last two chunks of the buffer
+recent_onset_frame = (BUFFER_DURATION - CHUNK_DURATION * 2) * SAMPLE_RATE / HOP_LENGTH
+
 
 class RealtimeBeatDetector:
     """Detects beats in real-time audio stream with phase tracking"""
     
     def __init__(self):
-        self.audio_buffer = np.zeros(buffer_size)
+        # Ring buffer backed by 2x scratch space so the latest window is always
+        # a contiguous slice; it is only compacted once the write head hits the end
+        self._scratch = np.zeros(2 * buffer_size, dtype=np.float32)
+        self._head = buffer_size
         self.last_bpm = START_BPM
         self.last_beat_time = 0
-        self.onset_env = None
+        
+        # Onset envelope for the buffered window, extended only by the frames
+        # each new chunk completes. The initial silent window counts as seen.
+        self.onset_env = np.zeros(onset_frames, dtype=np.float32)
+        self._samples_seen = buffer_size
+        self._next_frame = (buffer_size - N_FFT) // HOP_LENGTH + 1
         
         # Beat tracking for phase prediction
         self.beat_times = deque(maxlen=8)  # Keep last 8 beat times
@@ -48,11 +63,60 @@ class RealtimeBeatDetector:
         self.next_predicted_beat = None
         self.prediction_tolerance = 0.15  # seconds - window for accepting predicted beat
         
+    @property
+    def audio_buffer(self):
+        """Most recent BUFFER_DURATION seconds of audio (a view, not a copy)"""
+        return self._scratch[self._head - buffer_size:self._head]
+    
+    def _append(self, samples):
+        """Write new samples at the head of the ring buffer"""
+        n = len(samples)
+        if self._head + n > len(self._scratch):
+            # Move the latest window back to the front to make room
+            self._scratch[:buffer_size] = self._scratch[self._head - buffer_size:self._head]
+            self._head = buffer_size
+        self._scratch[self._head:self._head + n] = samples
+        self._head += n
+        self._samples_seen += n
+    
+    def _update_onset_env(self):
+        """Append onset strength for the analysis frames completed since the last chunk"""
+        last_frame = (self._samples_seen - N_FFT) // HOP_LENGTH
+        n_new = last_frame - self._next_frame + 1
+        if n_new <= 0:
+            return
+        
+        # Start one frame early so spectral flux has a predecessor to diff against
+        start = self._head - (self._samples_seen - (self._next_frame - 1) * HOP_LENGTH)
+        end = start + n_new * HOP_LENGTH + N_FFT
+        # onset_strength does not pass center on to the spectrogram, so frame the
+        # segment here; a centred spectrogram would zero-pad both of its ends.
+        # The dB floor (top_db) is relative to this segment rather than the stream.
+        S = librosa.power_to_db(librosa.feature.melspectrogram(
+            y=self._scratch[start:end],
+            sr=SAMPLE_RATE,
+            n_fft=N_FFT,
+            hop_length=HOP_LENGTH,
+            center=False
+        ))
+        new_env = librosa.onset.onset_strength(
+            S=S,
+            sr=SAMPLE_RATE,
+            n_fft=N_FFT,
+            hop_length=HOP_LENGTH,
+            center=False
+        )[1:]
+        self._next_frame = last_frame + 1
+        
+        # Slide the envelope left and write the new frames at the tail
+        n_new = min(n_new, onset_frames)
+        self.onset_env[:-n_new] = self.onset_env[n_new:]
+        self.onset_env[-n_new:] = new_env[-n_new:]
+        
     def process_chunk(self, audio_chunk):
         """Process audio chunk and detect if a beat occurred"""
-        # Roll buffer and add new chunk
-        self.audio_buffer = np.roll(self.audio_buffer, -len(audio_chunk))
-        self.audio_buffer[-len(audio_chunk):] = audio_chunk.flatten()
+        # Add new chunk to the ring buffer
+        self._append(audio_chunk.reshape(-1))
         
         current_time = time.time()
         
@@ -65,32 +129,24 @@ class RealtimeBeatDetector:
             if abs(time_to_predicted) < self.prediction_tolerance:
                 predicted_beat = True
         
-        # Compute onset strength envelope
-        self.onset_env = librosa.onset.onset_strength(
-            y=self.audio_buffer, 
-            sr=SAMPLE_RATE
-        )
+        # Update onset strength envelope with the new frames only
+        self._update_onset_env()
         
         # Detect beats in the onset envelope
         beat_frames = librosa.onset.onset_detect(
             onset_envelope=self.onset_env,
             sr=SAMPLE_RATE,
+            hop_length=HOP_LENGTH,
             backtrack=False
         )
         
         # Check if there's a recent beat (in the last chunk)
         onset_beat = False
-        if len(beat_frames) > 0:
-            # Convert frames to time
-            beat_times = librosa.frames_to_time(beat_frames, sr=SAMPLE_RATE)
-            
-            # Check for beats in the most recent portion
-            recent_beats = beat_times[beat_times > (BUFFER_DURATION - CHUNK_DURATION * 2)]
-            
-            if len(recent_beats) > 0:
-                # Prevent triggering too frequently
-                if current_time - self.last_beat_time > MIN_BEAT_INTERVAL:
-                    onset_beat = True
+        # Frames come back sorted, so only the last one needs checking
+        if len(beat_frames) > 0 and beat_frames[-1] > recent_onset_frame:
+            # Prevent triggering too frequently
+            if current_time - self.last_beat_time > MIN_BEAT_INTERVAL:
+                onset_beat = True
         
         # Trigger beat if either onset detected OR prediction says it's time
         if onset_beat or predicted_beat:
@@ -99,11 +155,8 @@ class RealtimeBeatDetector:
             
             # Update beat period based on recent beats
             if len(self.beat_times) >= 2:
-                # Calculate average period from recent beats
-                intervals = []
-                for i in range(1, len(self.beat_times)):
-                    intervals.append(self.beat_times[i] - self.beat_times[i-1])
-                self.beat_period = np.mean(intervals)
+                # The mean of consecutive intervals telescopes to the span over the count
+                self.beat_period = (self.beat_times[-1] - self.beat_times[0]) / (len(self.beat_times) - 1)
             
             # Predict next beat
             self.next_predicted_beat = current_time + self.beat_period
@@ -113,11 +166,13 @@ class RealtimeBeatDetector:
         
         return False, None
     
-    def get_bpm(self):
-        """Get current BPM estimate"""
+    def get_bpm(self, audio=None):
+        """Get current BPM estimate, optionally from a snapshot of the buffer"""
+        if audio is None:
+            audio = self.audio_buffer
         try:
             tempo, _ = librosa.beat.beat_track(
-                y=self.audio_buffer,
+                y=audio,
                 sr=SAMPLE_RATE,
                 start_bpm=self.last_bpm,
                 tightness=TIGHTNESS
@@ -150,12 +205,36 @@ async def head_bob(dog, bob_duration_ms):
         await asyncio.sleep(bob_duration_ms / 1000)
 
 
+async def bob_consumer(dog, bob_requests):
+    """Perform queued head bobs one at a time"""
+    while True:
+        bob_duration_ms = await bob_requests.get()
+        await head_bob(dog, bob_duration_ms)
+
+
 async def audio_processing_loop(detector, dog):
     """Main loop for processing audio and controlling robot"""
     beat_count = 0
     bob_count = 0
     bpm_update_interval = 20  # Update BPM estimate every N chunks
     chunk_count = 0
+    loop = asyncio.get_running_loop()
+    bpm_future = None  # Pending BPM estimate running in a worker thread
+    
+    # Audio arrives via the sounddevice callback thread and is handed to the loop
+    chunks = asyncio.Queue(maxsize=4)
+    
+    def enqueue_chunk(chunk):
+        if chunks.full():
+            chunks.get_nowait()  # Drop the oldest chunk rather than fall further behind
+        chunks.put_nowait(chunk)
+    
+    def on_audio(indata, frames, time_info, status):
+        loop.call_soon_threadsafe(enqueue_chunk, indata.copy())
+    
+    # One long-lived task performs the bobs; a bob requested while one is pending is dropped
+    bob_requests = asyncio.Queue(maxsize=1)
+    bob_task = asyncio.create_task(bob_consumer(dog, bob_requests))
     
     print("Listening for beats...")
     print("Make some rhythmic sounds or play music!")
@@ -163,11 +242,11 @@ async def audio_processing_loop(detector, dog):
     print("Press Ctrl+C to stop.\n")
     
     try:
-        with sd.InputStream(samplerate=SAMPLE_RATE, channels=1, 
-                           blocksize=chunk_size) as stream:
+        with sd.InputStream(samplerate=SAMPLE_RATE, channels=1, dtype="float32",
+                           blocksize=chunk_size, callback=on_audio):
             while True:
-                # Read audio chunk
-                audio_chunk, _ = stream.read(chunk_size)
+                # Wait for the next audio chunk
+                audio_chunk = await chunks.get()
                 
                 # Process chunk and check for beat
                 beat_detected, beat_type = detector.process_chunk(audio_chunk)
@@ -185,22 +264,28 @@ async def audio_processing_loop(detector, dog):
                         print(f"🎵 Beat {beat_count} {type_str} | Bob #{bob_count} | Duration: {bob_duration_ms}ms")
                         
                         # Trigger head bob (non-blocking)
-                        asyncio.create_task(head_bob(dog, bob_duration_ms))
+                        try:
+                            bob_requests.put_nowait(bob_duration_ms)
+                        except asyncio.QueueFull:
+                            pass
                     else:
                         print(f"   Beat {beat_count} {type_str} | Period: {beat_period_ms:.0f}ms (skipping bob)")
                 
                 # Periodically update BPM estimate
                 chunk_count += 1
-                if chunk_count % bpm_update_interval == 0:
-                    bpm = detector.get_bpm()
-                    measured_bpm = 60.0 / detector.beat_period if detector.beat_period > 0 else 0
-                    print(f"   Librosa BPM: {bpm:.1f} | Measured BPM: {measured_bpm:.1f}")
-                
-                # Small sleep to prevent CPU overload
-                await asyncio.sleep(0.01)
+                if chunk_count % bpm_update_interval == 0 and (bpm_future is None or bpm_future.done()):
+                    if bpm_future is not None:
+                        bpm = bpm_future.result()
+                        measured_bpm = 60.0 / detector.beat_period if detector.beat_period > 0 else 0
+                        print(f"   Librosa BPM: {bpm:.1f} | Measured BPM: {measured_bpm:.1f}")
+                    # Beat tracking is slow, so run it on a snapshot off the event loop
+                    snapshot = detector.audio_buffer.copy()
+                    bpm_future = loop.run_in_executor(None, detector.get_bpm, snapshot)
                 
     except KeyboardInterrupt:
         print("\nStopped by user")
+    finally:
+        bob_task.cancel()
 
 
 async def main():
@@ -210,14 +295,10 @@ async def main():
         # Initialize robot
         print("Connecting to robot...")
         dog = Go1()
-        dog.init()
-        
-        # Wait for connection
-        start_time = time.time()
-        while not dog.mqtt.connected and (time.time() - start_time < 10):
-            await asyncio.sleep(0.1)
-        
-        if not dog.mqtt.connected:
+        # init() blocks until the broker acknowledges, so run it off the event loop
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, dog.init)
+        except OSError:  # ConnectionError or a socket error
             print("Failed to connect to robot")
             return
         
@@ -1,9 +1,16 @@
 import asyncio
 import logging
 import shutil
-import subprocess
+import sys
 import time
-from typing import Awaitable, Callable, List, Tuple, NamedTuple
+from itertools import cycle, islice
+from typing import Awaitable, Callable, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+# The routine runs on asyncio.TaskGroup/ExceptionGroup; fail here, before the
+# song is analysed or the robot is touched, rather than mid-routine
+if sys.version_info < (3, 11):
+    sys.exit(f"This example needs Python 3.11 or newer (running {sys.version_info.major}.{sys.version_info.minor})")
+
 import librosa
 import matplotlib.pyplot as plt
 import IPython.display as ipd
@@ -45,10 +52,30 @@ print(f"Beat times (seconds): {beat_times}")
 BEAT_DURATION_MS = int((60 / tempo) * 1000)  # Duration of one beat in milliseconds
 TWO_BEAT_DURATION_MS = BEAT_DURATION_MS * 2  # Duration of two beats
 
-logger.info(f"Calculated Beat Duration: {BEAT_DURATION_MS}ms per beat ({tempo} BPM)")
+logger.info("Calculated Beat Duration: %sms per beat (%s BPM)", BEAT_DURATION_MS, tempo)
 
 # Set True to auto-play the clip via ffplay (if available).
 AUTO_PLAY = False
+# Resolved once at import so the PATH search stays out of the pre-music countdown
+_FFPLAY = shutil.which("ffplay") if AUTO_PLAY else None
+
+# Moves that finish a left/right or up/down pair and leave the body centred,
+# so no reset_body is needed after them
+NEUTRAL_ENDING_MOVES = frozenset({"look_down", "lean_right", "twist_right", "squat_down"})
+
+# Schedule deadlines are integer time.monotonic_ns() values so they accumulate exactly
+NS_PER_MS = 1_000_000
+NS_PER_S = 1_000_000_000
+MODE_SETTLE_NS = NS_PER_S  # Allow mode transition time at the start of each block
+RESET_NS = NS_PER_S + 500 * NS_PER_MS  # reset_body holds for 1s, then settle
+
+# Routine timing, derived once as integers so the scheduler only adds
+MOVE_DURATION_MS = TWO_BEAT_DURATION_MS  # Align moves with the beat structure
+PAUSE_MS = 200  # Pause for recovery between moves
+STEP_NS = (MOVE_DURATION_MS + PAUSE_MS) * NS_PER_MS  # One move slot, including its pause
+
+# Strong references to fire-and-forget tasks so they are not garbage collected
+_background_tasks: Set[asyncio.Task] = set()
 
 # Define Move as a NamedTuple with proper typing
 class Move(NamedTuple):
@@ -57,6 +84,14 @@ class Move(NamedTuple):
     description: str
 
 
+class TimelineEntry(NamedTuple):
+    """One scheduled step of the routine; ``move`` is None for a body reset."""
+    label: str
+    intensity: float
+    mode: Go1Mode
+    move: Optional[Move]
+
+
 # ============================================================================
 # BEAT-TO-MODE MAPPING SYSTEM
 # ============================================================================
@@ -115,88 +150,188 @@ class BeatModeMapper:
         return (start_time, end_time)
 
 
-async def maybe_start_music() -> None:
-    """Prompt the user (or auto-play) to start the music clip."""
+async def _drain(stream: asyncio.StreamReader) -> None:
+    """Read a pipe to EOF so the writer never blocks on a full buffer."""
+    while await stream.read(4096):
+        pass
+
+
+async def maybe_start_music() -> int:
+    """Prompt the user (or auto-play) to start the music clip.
+    
+    Returns:
+        time.monotonic_ns() at which the music is taken to have started
+    """
     if AUTO_PLAY:
-        if shutil.which("ffplay") is None:
+        if _FFPLAY is None:
             logger.warning("AUTO_PLAY=True but ffplay not found; start music manually.")
         else:
             logger.info("Auto-playing clip with ffplay: %s", SONG_CLIP_PATH)
-            subprocess.Popen(
-                ["ffplay", "-nodisp", "-autoexit", SONG_CLIP_PATH],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
+            proc = await asyncio.create_subprocess_exec(
+                _FFPLAY, "-nodisp", "-autoexit", SONG_CLIP_PATH,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE
             )
-            await asyncio.sleep(0.5)
-            return
+            # ffplay reports the audio stream once it has opened it; use that
+            # rather than a fixed delay as the start of playback
+            async def wait_for_audio_stream() -> None:
+                while True:
+                    line = await proc.stderr.readline()
+                    if not line or b"Audio:" in line:
+                        return
+            
+            # One deadline for the whole scan. ValueError means a line (e.g. the
+            # \r-terminated progress output) outgrew the reader's buffer limit.
+            try:
+                await asyncio.wait_for(wait_for_audio_stream(), timeout=2.0)
+            except (asyncio.TimeoutError, ValueError):
+                logger.warning("ffplay did not report its audio stream; assuming playback started")
+            music_start = time.monotonic_ns()
+            drain = asyncio.create_task(_drain(proc.stderr))
+            _background_tasks.add(drain)
+            drain.add_done_callback(_background_tasks.discard)
+            return music_start
 
     logger.info("Start the music clip now: %s (%ss from %s)", SONG_TITLE, SONG_CLIP_DURATION_S, SONG_CLIP_START_OFFSET)
     for count in range(3, 0, -1):
         logger.info("Starting in %d...", count)
         await asyncio.sleep(1)
+    return time.monotonic_ns()
+
+
+async def sleep_until(deadline_ns: int) -> None:
+    """Sleep until an absolute time.monotonic_ns() deadline, returning at once if it has passed."""
+    loop = asyncio.get_running_loop()
+    # Translate into the loop's own clock, which need not be time.monotonic() (e.g. uvloop)
+    when = loop.time() + (deadline_ns - time.monotonic_ns()) / NS_PER_S
+    waiter = loop.create_future()
+    handle = loop.call_at(when, waiter.set_result, None)
+    try:
+        await waiter
+    finally:
+        handle.cancel()
 
 
-def build_sequence(pattern: List[Move], count: int) -> List[Move]:
+def build_timeline(
+    sections: Iterable[Tuple[str, Iterable[Move], float, Go1Mode]]
+) -> Tuple[TimelineEntry, ...]:
+    """Flatten dance sections into a single timeline.
+    
+    A body reset is inserted between sections unless the previous section
+    already ended on a move that leaves the body neutral.
+    
+    Args:
+        sections: (label, moves, intensity, mode) for each section, in order
+        
+    Returns:
+        Tuple of timeline entries covering the whole routine
+    """
+    timeline: List[TimelineEntry] = []
+    for label, moves, intensity, mode in sections:
+        last = timeline[-1] if timeline else None
+        if last is not None and last.move is not None \
+                and last.move.func.__name__ not in NEUTRAL_ENDING_MOVES:
+            timeline.append(last._replace(move=None))
+        timeline.extend(TimelineEntry(label, intensity, mode, move) for move in moves)
+    return tuple(timeline)
+
+
+def build_sequence(pattern: Iterable[Move], count: int) -> Tuple[Move, ...]:
     """Repeat a move pattern until a specific count is reached.
     
     Args:
-        pattern: List of moves to repeat
+        pattern: Moves to repeat
         count: Number of moves to generate
         
     Returns:
-        List of moves (repeated pattern truncated to count)
+        Tuple of moves (repeated pattern truncated to count)
     """
-    sequence: List[Move] = []
-    while len(sequence) < count:
-        sequence.extend(pattern)
-    return sequence[:count]
+    return tuple(islice(cycle(pattern), count))
 
 
-async def perform_block(
+async def perform_timeline(
     dog: Go1,
-    label: str,
-    moves: List[Move],
-    intensity: float,
+    timeline: Tuple[TimelineEntry, ...],
     duration_ms: int,
-    pause_s: float,
-    mode: Go1Mode = Go1Mode.STAND
-) -> None:
-    """Run a labeled block of moves with error handling and mode control.
+    step_ns: int,
+    start_ns: int
+) -> int:
+    """Run the whole routine from one timeline with error handling and mode control.
+    
+    Every step is scheduled against absolute deadlines measured from
+    ``start_ns``, so overshoot in one move does not delay the rest. The mode
+    is set and the block header logged whenever the block label changes.
     
     Args:
         dog: Go1 robot instance
-        label: Name/description of this block
-        moves: List of Move objects to execute
-        intensity: Speed multiplier (0.0 to 1.0)
+        timeline: Entries built by build_timeline
         duration_ms: Duration for each move in milliseconds
-        pause_s: Pause between moves in seconds
-        mode: Go1Mode to set before executing moves
+        step_ns: Length of one move slot, including its pause, in ns
+        start_ns: time.monotonic_ns() at which the routine starts
+        
+    Returns:
+        Monotonic time in ns at which the timeline's schedule ends
         
     Raises:
-        RuntimeError: If connection is lost during execution
+        RuntimeError: If connection is lost or a move fails during execution
     """
-    logger.info("Block: %s (intensity: %.0f%%, mode: %s)", label, intensity * 100, mode.value)
+    n_moves = sum(entry.move is not None for entry in timeline)
+    deadline = start_ns
+    label = None
+    current = 0
+    step_name = ""
+    # Checked once up front so per-move logging costs nothing when DEBUG is off
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
     
-    # Set mode for this block
-    dog.set_mode(mode)
-    await asyncio.sleep(1)  # Allow mode transition time
+    async def watch_connection() -> None:
+        await dog.wait_for_disconnect()
+        raise RuntimeError("MQTT connection lost during dance")
     
-    for i, move in enumerate(moves):
-        # Check connection status
-        if not dog.mqtt.connected:
+    # asyncio.TaskGroup needs Python 3.11+. Any failure (a move, or the connection
+    # watcher) cancels everything still running in the routine at once.
+    try:
+        async with asyncio.TaskGroup() as routine:
+            watcher = routine.create_task(watch_connection())
+            for entry in timeline:
+                if entry.label != label:
+                    label = entry.label
+                    logger.info("Block: %s (intensity: %.0f%%, mode: %s)",
+                                label, entry.intensity * 100, entry.mode.value)
+                    dog.set_mode(entry.mode)
+                    deadline += MODE_SETTLE_NS
+                    await sleep_until(deadline)
+                
+                if entry.move is None:
+                    step_name = "Reset body"
+                    await dog.reset_body()
+                    deadline += RESET_NS
+                    await sleep_until(deadline)
+                    continue
+                
+                current += 1
+                step_name = entry.move.description
+                if debug_enabled:
+                    logger.debug("  [%d/%d] %s", current, n_moves, step_name)
+                
+                # The move and the wait for its slot to end run concurrently, so the
+                # pause overlaps the move's tail instead of following it
+                deadline += step_ns
+                async with asyncio.TaskGroup() as step:
+                    step.create_task(entry.move.func(entry.intensity, duration_ms))  # (speed, duration_ms), positionally
+                    step.create_task(sleep_until(deadline))
+            watcher.cancel()
+    except ExceptionGroup as group:
+        error = group
+        while isinstance(error, ExceptionGroup):
+            error = error.exceptions[0]
+        if watcher.done() and not watcher.cancelled():
             logger.error("Lost connection during block '%s' at move %d/%d", 
-                        label, i + 1, len(moves))
-            raise RuntimeError("MQTT connection lost during dance")
-
-        logger.info("  [%d/%d] %s", i + 1, len(moves), move.description)
-        
-        try:
-            # Call the move function with parameters
-            await move.func(speed=intensity, duration_ms=duration_ms)
-            await asyncio.sleep(pause_s)
-        except Exception as e:
-            logger.error("Error executing move '%s': %s", move.description, str(e))
-            raise
+                        label, current, n_moves)
+            raise error from None
+        logger.error("Error executing move '%s': %s", step_name, str(error))
+        raise RuntimeError(f"Move '{step_name}' failed") from error
+    
+    return deadline
 
 
 async def main():
@@ -218,18 +353,9 @@ async def main():
 
         # Connect to robot
         logger.info("Connecting to MQTT broker at 192.168.12.1:1883...")
-        dog.init()
-
-        # Wait for connection with proper timeout handling
-        timeout = 10
-        start_time = time.time()
-        while not dog.mqtt.connected:
-            elapsed = time.time() - start_time
-            if elapsed > timeout:
-                logger.error("Connection timeout after %.1f seconds", elapsed)
-                raise ConnectionError(f"Failed to connect within {timeout}s")
-            logger.debug("Waiting for connection... %.1fs", elapsed)
-            await asyncio.sleep(0.1)
+        # init() waits on the CONNACK callback (up to 10s) and raises
+        # ConnectionError on timeout, so run it off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, dog.init)
 
         logger.info("Connected to robot!")
 
@@ -252,105 +378,86 @@ async def main():
         # Initialize beat-to-mode mapper
         logger.info("Initializing beat-to-mode mapper...")
         beat_mapper = BeatModeMapper(beat_times, tempo)
-        logger.info(f"Using {len(beat_times)} detected beats for choreography")
+        logger.info("Using %d detected beats for choreography", len(beat_times))
 
         # Set to stand mode for choreography
         logger.info("Setting initial stand mode for choreography...")
         dog.set_mode(Go1Mode.STAND)
-        await asyncio.sleep(3)  # Increased wait for mode change
+        # Continue as soon as the robot reports the mode, waiting no longer than before
+        if not await dog.wait_for_mode(Go1Mode.STAND, timeout=3.0):
+            logger.warning("Stand mode not confirmed; continuing anyway")
 
         try:
-            await maybe_start_music()
-
-            # Calculate timings based on BPM
-            # At detected tempo: align moves with beat structure
-            move_duration_ms = TWO_BEAT_DURATION_MS  # Align with beat structure
-            pause_s = 0.2  # 200ms pause for recovery
-
             logger.info("Dance timing: %dms per move (%.2f beats), %dms pause",
-                       move_duration_ms, move_duration_ms / BEAT_DURATION_MS, int(pause_s * 1000))
+                       MOVE_DURATION_MS, MOVE_DURATION_MS / BEAT_DURATION_MS, PAUSE_MS)
 
             # Define base movement patterns
-            base_pattern: List[Move] = [
+            base_pattern: Tuple[Move, ...] = (
                 Move(dog.look_up, "Look up"),
                 Move(dog.look_down, "Look down"),
                 Move(dog.lean_left, "Lean left"),
                 Move(dog.lean_right, "Lean right"),
                 Move(dog.twist_left, "Twist left"),
                 Move(dog.twist_right, "Twist right"),
-            ]
+            )
 
-            bounce_pattern: List[Move] = [
+            bounce_pattern: Tuple[Move, ...] = (
                 Move(dog.extend_up, "Extend up"),
                 Move(dog.squat_down, "Squat down"),
-            ]
+            )
 
-            # Build dance sections with proper move counts
-            warmup_moves = build_sequence(base_pattern, 10)
-            verse_moves = build_sequence(base_pattern + bounce_pattern, 15)
-            chorus_moves = build_sequence(bounce_pattern + base_pattern + bounce_pattern, 15)
-            finale_moves = build_sequence(base_pattern + bounce_pattern, 10)
+            # Build dance sections with proper move counts, mapping each
+            # section's beat range to a mode
+            section_specs = [
+                ("Warmup (50% intensity)", build_sequence(base_pattern, 10), 0.5, (0, 10)),
+                ("Verse (70% intensity)", build_sequence(base_pattern + bounce_pattern, 15), 0.7, (10, 25)),
+                ("Chorus (90% intensity)", build_sequence(bounce_pattern + base_pattern + bounce_pattern, 15), 0.9, (25, 40)),
+                ("Finale (100% intensity)", build_sequence(base_pattern + bounce_pattern, 10), 1.0, (40, 50)),
+            ]
+            sections = []
+            for label, moves, intensity, (start_beat, end_beat) in section_specs:
+                mode = beat_mapper.get_mode_for_beat_range(start_beat, end_beat)
+                start_time_s, end_time_s = beat_mapper.get_beat_time_range(start_beat, end_beat)
+                logger.info("%s: beats %d-%d (%.2fs - %.2fs), mode: %s",
+                            label, start_beat, end_beat, start_time_s, end_time_s, mode.value)
+                sections.append((label, moves, intensity, mode))
+            timeline = build_timeline(sections)
 
             # Calculate estimated timing
-            total_moves = len(warmup_moves) + len(verse_moves) + len(chorus_moves) + len(finale_moves)
-            estimated_duration = total_moves * (move_duration_ms / 1000.0 + pause_s)
+            all_moves = tuple(entry.move for entry in timeline if entry.move is not None)
+            total_moves = len(all_moves)
+            estimated_duration = total_moves * STEP_NS / NS_PER_S
             logger.info("Routine will execute %d moves in approximately %.1fs",
                        total_moves, estimated_duration)
 
+            # Log the whole plan once up front; per-move lines are DEBUG only
+            plan = "\n".join(f"{i + 1:3d}/{total_moves} {move.description}"
+                              for i, move in enumerate(all_moves))
+            logger.info("Plan:\n%s", plan)
+
+            # Every block is timed from the moment the music starts
+            deadline = await maybe_start_music()
+
             # ========================================================================
             # BEAT-SYNCHRONIZED DANCE EXECUTION
             # ========================================================================
             
-            # Execute dance blocks with beat-mapped modes
+            # Execute the whole routine as one deadline-scheduled timeline
             logger.info("Starting beat-synchronized dance routine!")
-            
-            # Warmup section: beats 0-10, uses STAND mode for stability
-            warmup_mode = beat_mapper.get_mode_for_beat_range(0, 10)
-            start_time_s, end_time_s = beat_mapper.get_beat_time_range(0, 10)
-            logger.info(f"Warmup section: beats 0-10 ({start_time_s:.2f}s - {end_time_s:.2f}s), mode: {warmup_mode.value}")
-            await perform_block(dog, "Warmup (50% intensity)", warmup_moves, 0.5, 
-                              move_duration_ms, pause_s, mode=warmup_mode)
-            await dog.reset_body()
-            await asyncio.sleep(0.5)
-
-            # Verse section: beats 10-25, uses DANCE1 for dynamic movement
-            verse_mode = beat_mapper.get_mode_for_beat_range(10, 25)
-            start_time_s, end_time_s = beat_mapper.get_beat_time_range(10, 25)
-            logger.info(f"Verse section: beats 10-25 ({start_time_s:.2f}s - {end_time_s:.2f}s), mode: {verse_mode.value}")
-            await perform_block(dog, "Verse (70% intensity)", verse_moves, 0.7, 
-                              move_duration_ms, pause_s, mode=verse_mode)
+            deadline = await perform_timeline(dog, timeline, MOVE_DURATION_MS, STEP_NS, deadline)
             await dog.reset_body()
-            await asyncio.sleep(0.5)
-
-            # Chorus section: beats 25-40, uses DANCE2 for complex choreography
-            chorus_mode = beat_mapper.get_mode_for_beat_range(25, 40)
-            start_time_s, end_time_s = beat_mapper.get_beat_time_range(25, 40)
-            logger.info(f"Chorus section: beats 25-40 ({start_time_s:.2f}s - {end_time_s:.2f}s), mode: {chorus_mode.value}")
-            await perform_block(dog, "Chorus (90% intensity)", chorus_moves, 0.9, 
-                              move_duration_ms, pause_s, mode=chorus_mode)
-            await dog.reset_body()
-            await asyncio.sleep(0.5)
-
-            # Finale section: beats 40-50, maximal expression
-            finale_mode = beat_mapper.get_mode_for_beat_range(40, 50)
-            start_time_s, end_time_s = beat_mapper.get_beat_time_range(40, 50)
-            logger.info(f"Finale section: beats 40-50 ({start_time_s:.2f}s - {end_time_s:.2f}s), mode: {finale_mode.value}")
-            await perform_block(dog, "Finale (100% intensity)", finale_moves, 1.0, 
-                              move_duration_ms, pause_s, mode=finale_mode)
-            await dog.reset_body()
-            await asyncio.sleep(1)
+            deadline += 2 * NS_PER_S  # reset_body holds for 1s, then settle
+            await sleep_until(deadline)
 
             # Return to walk mode
             logger.info("Returning to walk mode...")
             dog.set_mode(Go1Mode.WALK)
-            await asyncio.sleep(2)
+            await dog.wait_for_mode(Go1Mode.WALK, timeout=2.0)
 
             logger.info("✓ Custom beat-synchronized dance routine completed successfully!")
 
-        except Exception as e:
-            logger.error("✗ Error during dance sequence: %s", str(e))
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("✗ Error during dance sequence")
         finally:
             # Always ensure we reset the body and stop movement
             try:
@@ -360,10 +467,8 @@ async def main():
             except Exception as e:
                 logger.warning("Error during reset: %s", str(e))
 
-    except Exception as e:
-        logger.error("✗ Error initializing robot: %s", str(e))
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("✗ Error initializing robot")
     finally:
         # Disconnect cleanly
         if dog is not None:
@@ -376,6 +481,11 @@ async def main():
 
 
 if __name__ == "__main__":
+    try:
+        import uvloop
+        uvloop.install()  # Lower per-await and timer overhead when available
+    except ImportError:
+        pass
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 import asyncio
 from dataclasses import dataclass
 from events import Events
@@ -18,6 +18,21 @@ class Go1Mode(str, Enum):
     RUN = "run"
     CLIMB = "climb"
 
+# Value reported in RobotState.mode once the robot has entered each mode
+MODE_STATE_VALUES: Dict[Go1Mode, int] = {
+    Go1Mode.STAND: 1,
+    Go1Mode.WALK: 2,
+    Go1Mode.RUN: 2,
+    Go1Mode.CLIMB: 2,
+    Go1Mode.STAND_DOWN: 5,
+    Go1Mode.STAND_UP: 6,
+    Go1Mode.DAMPING: 7,
+    Go1Mode.RECOVER_STAND: 8,
+    Go1Mode.STRAIGHT_HAND1: 11,
+    Go1Mode.DANCE1: 12,
+    Go1Mode.DANCE2: 13,
+}
+
 class Go1(Events):
     """
     Main class for controlling the Go1 quadruped robot.
@@ -40,6 +55,8 @@ class Go1(Events):
         
         self.mqtt = Go1MQTT(self, mqtt_options)
         self.go1_state = get_go1_state_copy()
+        self._mode_waiters: List[Tuple[int, asyncio.AbstractEventLoop, asyncio.Event]] = []
+        self._disconnect_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
 
     def init(self) -> None:
         """Initialize the connection to the robot."""
@@ -54,6 +71,10 @@ class Go1(Events):
             state: Current state of the Go1 robot
         """
         self.emit('go1_state_change', state)
+        # Called from the MQTT network thread, so hand off to each waiter's loop
+        for expected, loop, ready in tuple(self._mode_waiters):
+            if state.robot.mode == expected:
+                loop.call_soon_threadsafe(ready.set)
 
     def publish_connection_status(self, connected: bool) -> None:
         """
@@ -63,6 +84,21 @@ class Go1(Events):
             connected: Whether the robot is connected
         """
         self.emit('go1_connection_status', connected)
+        if not connected:
+            for loop, lost in tuple(self._disconnect_waiters):
+                loop.call_soon_threadsafe(lost.set)
+
+    async def wait_for_disconnect(self) -> None:
+        """Wait until the connection to the robot is lost."""
+        lost = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), lost)
+        # Register before checking so a disconnect in between is not missed
+        self._disconnect_waiters.append(waiter)
+        try:
+            if self.mqtt.connected:
+                await lost.wait()
+        finally:
+            self._disconnect_waiters.remove(waiter)
 
     async def go_forward(self, speed: float, duration_ms: int) -> None:
         """
@@ -279,4 +315,31 @@ class Go1(Events):
         Args:
             mode: The mode to set the robot to
         """
-        self.mqtt.send_mode_command(mode)
\ No newline at end of file
+        self.mqtt.send_mode_command(mode)
+
+    async def wait_for_mode(self, mode: Go1Mode, timeout: float) -> bool:
+        """
+        Wait until the robot reports that it has entered a mode.
+
+        Args:
+            mode: The mode to wait for
+            timeout: Maximum time to wait in seconds
+
+        Returns:
+            True if the robot confirmed the mode, False if the wait timed out
+        """
+        expected = MODE_STATE_VALUES.get(mode)
+        if expected is None:
+            await asyncio.sleep(timeout)
+            return False
+
+        ready = asyncio.Event()
+        waiter = (expected, asyncio.get_running_loop(), ready)
+        self._mode_waiters.append(waiter)
+        try:
+            await asyncio.wait_for(ready.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._mode_waiters.remove(waiter)
\ No newline at end of file
@@ -4,7 +4,8 @@ import paho.mqtt.client as mqtt
 import asyncio
 from dataclasses import dataclass
 import logging
-import time
+import socket
+import threading
 
 from .state import Go1State, get_go1_state_copy
 from .handler import message_handler
@@ -24,6 +25,9 @@ class MQTTConfig:
 class Go1MQTT:
     """MQTT client for communicating with the Go1 robot."""
     
+    # Four float32 zeros: the stick command that stops all motion
+    ZERO_PAYLOAD = bytes(16)
+    
     def __init__(self, go1: 'Go1', mqtt_options: Optional[Dict[str, Any]] = None):
         """
         Initialize the MQTT client for Go1.
@@ -50,6 +54,7 @@ class Go1MQTT:
         self.client: Optional[mqtt.Client] = None
         self.floats = np.zeros(4, dtype=np.float32)
         self.connected = False
+        self._connack = threading.Event()  # Set by _on_connect on any CONNACK
         
         # Topics
         self.movement_topic = "controller/stick"
@@ -80,6 +85,7 @@ class Go1MQTT:
             self.client.on_log = self._on_log
             
             # Connect to broker
+            self._connack.clear()
             self.client.connect(
                 host=self.config.host,
                 port=self.config.port,
@@ -87,13 +93,17 @@ class Go1MQTT:
             )
             self.client.loop_start()
             
-            # Wait for connection to establish
+            # Wait for the broker to acknowledge the connection
             timeout = 10  # seconds
-            start_time = time.time()
-            while not self.connected:
-                if time.time() - start_time > timeout:
-                    raise ConnectionError("Connection timeout")
-                time.sleep(0.1)
+            if not self._connack.wait(timeout):
+                raise ConnectionError("Connection timeout")
+            if not self.connected:
+                raise ConnectionError("Connection refused by broker")
+            
+            # Commands are tiny and latency-sensitive, so don't let Nagle hold them back
+            sock = self.client.socket()
+            if sock is not None:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             
             logger.info("Successfully connected to MQTT broker")
             
@@ -118,6 +128,7 @@ class Go1MQTT:
             error_msg = error_messages.get(rc, f"Unknown error code: {rc}")
             logger.error(f"Failed to connect to MQTT broker: {error_msg}")
             self.connected = False
+        self._connack.set()
 
     def _on_disconnect(self, client, userdata, rc):
         """Callback for when the client disconnects from the broker."""
@@ -132,8 +143,8 @@ class Go1MQTT:
         """Callback for when a message is received."""
         try:
             logger.debug(f"Received message on topic {msg.topic}")
-            self.go1.publish_state(self.go1_state)
             message_handler(msg.topic, msg.payload, self.go1_state)
+            self.go1.publish_state(self.go1_state)
         except Exception as e:
             logger.error(f"Error processing message: {e}")
 
@@ -207,30 +218,35 @@ class Go1MQTT:
             return
 
         try:
-            # Send initial zero command
-            zero_floats = np.zeros(4, dtype=np.float32)
-            info = self.client.publish(
+            # Publishes are handed to paho's network thread (loop_start) and not
+            # waited on, so socket I/O never stalls the event loop
+            self.client.publish(
                 self.movement_topic,
-                zero_floats.tobytes(),
-                qos=0
+                self.ZERO_PAYLOAD,
+                qos=0,
+                retain=False
             )
-            info.wait_for_publish()  # Wait for the publish to complete
-            logger.debug("Sent initial zero command")
+            logger.debug("Queued initial zero command")
 
-            end_time = asyncio.get_event_loop().time() + (duration_ms / 1000.0)
+            # Serialise the speeds once; the same payload is repeated for the whole duration
+            payload = self.floats.tobytes()
+            loop = asyncio.get_running_loop()
+            end_time = loop.time() + (duration_ms / 1000.0)
             
-            while asyncio.get_event_loop().time() < end_time:
+            while loop.time() < end_time:
                 if not self.connected:
                     logger.error("Lost connection during movement")
                     return
                     
-                logger.debug(f"Sending command {self.floats}")
+                logger.debug("Sending command %s", self.floats)
                 info = self.client.publish(
                     self.movement_topic,
-                    self.floats.tobytes(),
-                    qos=0
+                    payload,
+                    qos=0,
+                    retain=False
                 )
-                info.wait_for_publish()
+                if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                    logger.error(f"Failed to queue movement command: {mqtt.error_string(info.rc)}")
                 await asyncio.sleep(self.publish_frequency)
 
         except Exception as e:
@@ -251,8 +267,10 @@ class Go1MQTT:
 
         try:
             command = f"child_conn.send('change_light({r},{g},{b})')"
-            info = self.client.publish(self.led_topic, command, qos=0)
-            info.wait_for_publish()
+            info = self.client.publish(self.led_topic, command, qos=0, retain=False)
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                logger.error(f"Failed to queue LED command: {mqtt.error_string(info.rc)}")
+                return
             logger.debug(f"Sent LED command: R={r}, G={g}, B={b}")
         except Exception as e:
             logger.error(f"Error sending LED command: {e}")
@@ -269,8 +287,12 @@ class Go1MQTT:
             return
 
         try:
-            info = self.client.publish(self.mode_topic, mode.value, qos=1)
-            info.wait_for_publish()
+            # A mode change is a one-off state transition rather than part of a
+            # stream, so it keeps QoS 1; delivery is confirmed via _on_publish
+            info = self.client.publish(self.mode_topic, mode.value, qos=1, retain=False)
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                logger.error(f"Failed to queue mode command: {mqtt.error_string(info.rc)}")
+                return
             logger.info(f"Mode command sent: {mode.value}")
         except Exception as e:
             logger.error(f"Error sending mode command: {e}")
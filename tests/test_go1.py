@@ -2,6 +2,7 @@ import pytest
 import asyncio
 from unittest.mock import AsyncMock, Mock
 from go1pylib import Go1, Go1Mode
+from go1pylib.mqtt.state import get_go1_state_copy
 
 @pytest.fixture
 def mock_mqtt():
@@ -96,3 +97,24 @@ async def test_wait(go1_robot):
     await go1_robot.wait(1000)  # 1 second
     end_time = asyncio.get_event_loop().time()
     assert (end_time - start_time) >= 1
+
+
+@pytest.mark.asyncio
+async def test_wait_for_mode_confirmed(go1_robot):
+    state = get_go1_state_copy()
+    state.robot.mode = 12  # dance1
+    asyncio.get_running_loop().call_later(0.05, go1_robot.publish_state, state)
+    assert await go1_robot.wait_for_mode(Go1Mode.DANCE1, timeout=1.0)
+
+@pytest.mark.asyncio
+async def test_wait_for_mode_timeout(go1_robot):
+    state = get_go1_state_copy()
+    state.robot.mode = 2  # walk
+    go1_robot.publish_state(state)
+    assert not await go1_robot.wait_for_mode(Go1Mode.STAND, timeout=0.1)
+
+@pytest.mark.asyncio
+async def test_wait_for_disconnect(go1_robot):
+    go1_robot.mqtt.connected = True
+    asyncio.get_running_loop().call_later(0.05, go1_robot.publish_connection_status, False)
+    await asyncio.wait_for(go1_robot.wait_for_disconnect(), timeout=1.0)
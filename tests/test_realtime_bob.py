@@ -0,0 +1,52 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "beat_routine"))
+try:
+    import librosa
+    import realtime_bob
+except (ImportError, OSError):  # OSError: sounddevice without PortAudio
+    pytest.skip("realtime_bob needs librosa and sounddevice", allow_module_level=True)
+
+
+def _clicks_over_noise(duration_s):
+    sr = realtime_bob.SAMPLE_RATE
+    rng = np.random.default_rng(0)
+    n = int(duration_s * sr)
+    clicks = librosa.clicks(times=np.arange(0.25, duration_s, 0.5), sr=sr, length=n)
+    # The noise floor keeps every bin well inside top_db, so the per-update
+    # dB floor never clips and the envelopes can be compared exactly
+    return (clicks + 0.01 * rng.standard_normal(n)).astype(np.float32)
+
+
+def test_incremental_onset_env_matches_whole_stream():
+    """Chunk-by-chunk onset envelope equals a non-centred envelope of the whole stream."""
+    audio = _clicks_over_noise(20)
+    detector = realtime_bob.RealtimeBeatDetector()
+    for start in range(0, len(audio), realtime_bob.chunk_size):
+        detector._append(audio[start:start + realtime_bob.chunk_size])
+        detector._update_onset_env()
+
+    # The detector treats its initial silent window as already seen
+    stream = np.concatenate([np.zeros(realtime_bob.buffer_size, dtype=np.float32), audio])
+    S = librosa.power_to_db(librosa.feature.melspectrogram(
+        y=stream,
+        sr=realtime_bob.SAMPLE_RATE,
+        n_fft=realtime_bob.N_FFT,
+        hop_length=realtime_bob.HOP_LENGTH,
+        center=False
+    ))
+    reference = librosa.onset.onset_strength(
+        S=S,
+        sr=realtime_bob.SAMPLE_RATE,
+        n_fft=realtime_bob.N_FFT,
+        hop_length=realtime_bob.HOP_LENGTH,
+        center=False
+    )
+    last_frame = (detector._samples_seen - realtime_bob.N_FFT) // realtime_bob.HOP_LENGTH
+    expected = reference[last_frame + 1 - realtime_bob.onset_frames:last_frame + 1]
+
+    np.testing.assert_allclose(detector.onset_env, expected, rtol=1e-4, atol=1e-4)